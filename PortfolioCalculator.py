@@ -387,16 +387,14 @@ class PortfolioCalculator:
                     liquidation_series=f"mr_lm_vt_{token}_{self.vtPosInit}", \
                         margin_series=f"mr_im_vt_{token}_{self.vtPosInit}", pnl_series=f"pnl_vt_{token}_{self.vtPosInit}")
             
-            l_rep_lp, i_rep_lp = risk_LP.generate_replicates(N_replicates=100)
-            l_var_lp, i_var_lp = risk_LP.lvar_and_ivar(alpha=95, l_rep=l_rep_lp, i_rep=i_rep_lp)
+            # The actors share the same time grid, so their VaRs come from a single pooled bootstrap. Its block size
+            # is set by the FT and VT series, which (unlike the LP series) do not depend on the LP fee
+            (l_var_lp, i_var_lp), (l_var_ft, i_var_ft), (l_var_vt, i_var_vt) = \
+                RiskMetrics.batch_lvar_and_ivar([risk_LP, risk_FT, risk_VT], alpha=95, N_replicates=100, \
+                    block_risks=[risk_FT, risk_VT])
+
             l_lev_lp, i_lev_lp = risk_LP.leverages(l_var=l_var_lp, i_var=i_var_lp)
-            
-            l_rep_ft, i_rep_ft = risk_FT.generate_replicates(N_replicates=100)
-            l_var_ft, i_var_ft = risk_FT.lvar_and_ivar(alpha=95, l_rep=l_rep_ft, i_rep=i_rep_ft)
             l_lev_ft, i_lev_ft = risk_FT.leverages(l_var=l_var_ft, i_var=i_var_ft)
-
-            l_rep_vt, i_rep_vt = risk_VT.generate_replicates(N_replicates=100)
-            l_var_vt, i_var_vt = risk_VT.lvar_and_ivar(alpha=95, l_rep=l_rep_vt, i_rep=i_rep_vt)
             l_lev_vt, i_lev_vt = risk_VT.leverages(l_var=l_var_vt, i_var=i_var_vt)
             
             # Save the VaRs
@@ -1,12 +1,35 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import random
+from functools import lru_cache
 
 """
 bashtage/arch: Release 4.18 (Version v4.18). Zenodo. https://doi.org/10.5281/zenodo.593254
 pip3 install arch --user
 """
 from arch.bootstrap import CircularBlockBootstrap, optimal_block_length
+from numba import njit
+
+# Series shorter than this are too short for the optimal_block_length estimate, so use the AR(1)
+# plug-in block size (short_series_block_size) instead
+MIN_LENGTH_FOR_OPTIMAL_BLOCK = 30
+
+"""
+    Means of the circular block bootstrap replicates of the series x. Each row of starts
+    holds the block start indices of a replicate, so replicate r is built from the blocks
+    x[starts[r, b]:starts[r, b]+block_size] (wrapping around the end of x) and truncated to len(x).
+    Equivalent to the replicate means from CircularBlockBootstrap, without materialising the replicates.
+    Kept serial: the work per call is small, and the kernel already runs inside the scenario worker processes
+"""
+@njit(cache=True)
+def circular_block_means(x, block_size, starts):
+    n = x.size
+    n_rep = starts.shape[0]
+    means = np.empty(n_rep)
+    for r in range(n_rep):
+        total = 0.0
+        for t in range(n):
+            total += x[(starts[r, t // block_size] + t % block_size) % n]
+        means[r] = total / n
+    return means
 
 """
     RiskMetrics object is instantiated with a given notional, and corresonding time series
@@ -33,6 +56,7 @@ class RiskMetrics():
         self.pnl_series = df[pnl_series] 
         self.liquidation = self.liquidation()
         self.insolvency = self.insolvency()
+        self._leverages = None # (L-Lev, I-Lev), cached by recommended_leverage
 
     """
         Liquidation time series, from input margin and 
@@ -53,54 +77,154 @@ class RiskMetrics():
         return (self.pnl_series + self.margin_series.iloc[0]) / self.margin_series.iloc[0]
 
     """
-        Generate very small random numbers to decorate the liquidation and insolvency series with
-        (necessary to avoid NaNs in the replicater generation)
+        Generate an array of very small random numbers to decorate the liquidation and insolvency 
+        series with (necessary to avoid NaNs in the replicater generation)
     """
     @staticmethod
-    def get_random(): 
-        exp = random.randint(-5, -2) 
-        significand = 0.9 * random.random() + 0.1 
-        return significand * 10**exp 
+    def get_random(rng, size): 
+        exp = rng.integers(-5, -1, size=size) 
+        significand = 0.9 * rng.random(size) + 0.1 
+        return significand * 10.0**exp 
     
+    """
+        Raw bytes of the liquidation and insolvency series (after dropping NaNs), used
+        as the keys for the memoised bootstrapping below
+    """
+    def _series_bytes(self):
+        self.liquidation.dropna(inplace=True)
+        self.insolvency.dropna(inplace=True)
+
+        return self.liquidation.to_numpy(dtype=np.float64).tobytes(), self.insolvency.to_numpy(dtype=np.float64).tobytes()
+
     """
         Time series block bootstrapping to produce N_replicates
         number of replicates. Assumes the autocorrelation structure of the
         time series is over some horizon given by time_delta 
     """
     def generate_replicates(self, N_replicates=100):
-        rs = np.random.RandomState(42)
+        liq_bytes, ins_bytes = self._series_bytes()
+        return self.bootstrap_replicates(liq_bytes, ins_bytes, N_replicates)
 
-        self.liquidation.dropna(inplace=True)
-        self.insolvency.dropna(inplace=True)
+    """
+        Means of the N_replicates block bootstrap replicates, which is all that the 
+        CLT-based VaRs need
+    """
+    def replicate_means(self, N_replicates=100):
+        liq_bytes, ins_bytes = self._series_bytes()
+        return self.bootstrap_means(liq_bytes, ins_bytes, N_replicates)
+
+    """
+        Decorate the liquidation and insolvency series with the (seeded) random noise, and 
+        get the corresponding block sizes for the circular block bootstrap. Memoised on the raw
+        bytes of the series, returning read-only arrays
+    """
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def prepare_series(liq_bytes, ins_bytes):
+        rng = np.random.default_rng(42)
+
+        liq = np.frombuffer(liq_bytes, dtype=np.float64)
+        ins = np.frombuffer(ins_bytes, dtype=np.float64)
         
-        liq = np.array([l+self.get_random() for l in self.liquidation.values])
-        ins = np.array([i+self.get_random() for i in self.insolvency.values])
-        # Optimal block lengths    
-        time_delta_l = optimal_block_length(liq)["circular"].values[0]
-        time_delta_i = optimal_block_length(ins)["circular"].values[0]
+        liq = liq + RiskMetrics.get_random(rng, len(liq))
+        ins = ins + RiskMetrics.get_random(rng, len(ins))
+        liq.setflags(write=False)
+        ins.setflags(write=False)
+
+        return liq, ins, RiskMetrics.block_size(liq.tobytes()), RiskMetrics.block_size(ins.tobytes())
+
+    """
+        Circular block size from the optimal block length of a (decorated) series. This only
+        depends on the series itself, so is memoised on its raw bytes, e.g. the LP liquidation
+        series is shared across the different LP fees whilst the LP insolvency series is not.
+        Series which are too short for the optimal block length estimate use short_series_block_size
+    """
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def block_size(x_bytes):
+        x = np.frombuffer(x_bytes, dtype=np.float64)
+        if len(x) < MIN_LENGTH_FOR_OPTIMAL_BLOCK:
+            return RiskMetrics.short_series_block_size(x)
+        time_delta = optimal_block_length(x)["circular"].values[0]
+        return int(time_delta)+1
+
+    """
+        Politis-White optimal circular block length, b = (2G^2/D)^(1/3) n^(1/3) with D = 4/3 g(0)^2, for an 
+        AR(1) model of the series with the sample lag-1 autocorrelation rho, for which 
+        G/g(0) = 2 rho / (1-rho^2). Rounded in the same way as in block_size, and capped at the series length
+    """
+    @staticmethod
+    def short_series_block_size(x):
+        x_c = x - x.mean()
+        var = x_c @ x_c
+        if var == 0:
+            return 1
+        rho = min(abs(x_c[1:] @ x_c[:-1]) / var, 0.99)
+        time_delta = (1.5 * (2*rho / (1-rho**2))**2)**(1/3) * len(x)**(1/3)
+        return min(int(time_delta)+1, len(x))
+
+    """
+        The replicates are fully determined by the input series (the random states are seeded), so we
+        memoise them on the raw bytes of the liquidation and insolvency series. E.g. the FT and VT series
+        are unchanged across the different LP fees in the simulator, so their replicates are reused.
+        The cached replicates are returned as read-only arrays
+    """
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def bootstrap_replicates(liq_bytes, ins_bytes, N_replicates=100):
+        rs = np.random.RandomState(42)
+        liq, ins, block_l, block_i = RiskMetrics.prepare_series(liq_bytes, ins_bytes)
 
         # Block bootstrapping
-        l_bs = CircularBlockBootstrap(block_size=int(time_delta_l)+1, x=liq, random_state=rs)
-        i_bs = CircularBlockBootstrap(block_size=int(time_delta_i)+1, x=ins, random_state=rs)
+        l_bs = CircularBlockBootstrap(block_size=block_l, x=liq, random_state=rs)
+        i_bs = CircularBlockBootstrap(block_size=block_i, x=ins, random_state=rs)
         
-        l_rep = [data[1]["x"].flatten() for data in l_bs.bootstrap(N_replicates)]
-        i_rep = [data[1]["x"].flatten() for data in i_bs.bootstrap(N_replicates)]
+        # Replicates are stored as (N_replicates, T) matrices
+        l_rep = np.empty((N_replicates, len(liq)), dtype=np.float64)
+        i_rep = np.empty((N_replicates, len(ins)), dtype=np.float64)
+        for i, data in enumerate(l_bs.bootstrap(N_replicates)):
+            l_rep[i] = data[1]["x"].ravel()
+        for i, data in enumerate(i_bs.bootstrap(N_replicates)):
+            i_rep[i] = data[1]["x"].ravel()
+        l_rep.setflags(write=False)
+        i_rep.setflags(write=False)
 
         return l_rep, i_rep
 
+    """
+        Replicate means from the circular block bootstrap, memoised in the same way as the replicates.
+        The block start indices are drawn in the same way as in the CircularBlockBootstrap, and the
+        means are computed directly in the compiled circular_block_means kernel
+    """
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def bootstrap_means(liq_bytes, ins_bytes, N_replicates=100):
+        rs = np.random.RandomState(42)
+        liq, ins, block_l, block_i = RiskMetrics.prepare_series(liq_bytes, ins_bytes)
+
+        l_starts = rs.randint(len(liq), size=(N_replicates, int(np.ceil(len(liq)/block_l))))
+        i_starts = rs.randint(len(ins), size=(N_replicates, int(np.ceil(len(ins)/block_i))))
+        
+        l_dist = circular_block_means(liq, block_l, l_starts)
+        i_dist = circular_block_means(ins, block_i, i_starts)
+        l_dist.setflags(write=False)
+        i_dist.setflags(write=False)
+
+        return l_dist, i_dist
+
     """
         Normalise a given vector of information such that the integral over its
         domain is unity, thus it is a true pdf
     """
     @staticmethod
     def normalise_vector(vector, plot=False):
-        normed = plt.hist(vector, density=True, label="Normalised")
+        _, edges = np.histogram(vector, density=True)
         if plot:
+            import matplotlib.pyplot as plt # Only needed for the check plot
+            plt.hist(vector, density=True, label="Normalised")
             plt.hist(vector, label="Unnormalised")
             plt.savefig("Normalised_check.png")
-            return normed[1]
-        else:
-            return normed[1]
+        return edges
 
     """
         Calculate the LVaR and IVaR according to the Gaussianity assumption for the
@@ -108,11 +232,19 @@ class RiskMetrics():
         from the replicate distributions, for a given time-horizon and Z-score (based on
         singificance level, alpha)
     """
-    def lvar_and_ivar(self, alpha=95, l_rep=None, i_rep=None):
-        z_score = self.z_scores[alpha]
+    def lvar_and_ivar(self, alpha=95, l_rep=None, i_rep=None, N_replicates=100):
         if (l_rep is None) or (i_rep is None):
-            l_rep, i_rep = self.generate_replicates()
-        l_dist, i_dist = np.array([l.mean() for l in l_rep]), np.array([i.mean() for i in i_rep]) # CLT => Gaussian
+            l_dist, i_dist = self.replicate_means(N_replicates=N_replicates) # CLT => Gaussian
+        else:
+            l_dist, i_dist = np.asarray(l_rep).mean(axis=1), np.asarray(i_rep).mean(axis=1) 
+
+        return self.vars_from_means(l_dist, i_dist, alpha=alpha)
+
+    """
+        LVaR and IVaR from the distributions of the liquidation and insolvency replicate means
+    """
+    def vars_from_means(self, l_dist, i_dist, alpha=95):
+        z_score = self.z_scores[alpha]
 
         l_mu, i_mu = l_dist.mean(), i_dist.mean()
         l_sig, i_sig = l_dist.std(), i_dist.std()
@@ -122,6 +254,66 @@ class RiskMetrics():
 
         return l_var, i_var 
 
+    """
+        LVaRs and IVaRs for several RiskMetrics objects defined over the same time grid (e.g. the LP, FT 
+        and VT in a given pool). All the series are bootstrapped with the largest of the block sizes of the
+        block_risks (all the risks by default), and with pooled start indices: one set shared by the liquidation
+        series and one by the insolvency series, drawn as in bootstrap_means. If all the block sizes coincide,
+        the VaRs are therefore the same as from lvar_and_ivar. Falls back to the individual VaRs if the series
+        lengths differ.
+
+        E.g. the LP insolvency series changes with the LP fee whilst the FT and VT series do not, so passing
+        block_risks=[risk_FT, risk_VT] keeps the FT and VT VaRs (and their cached means) fixed across the fees
+    """
+    @classmethod
+    def batch_lvar_and_ivar(cls, risks, alpha=95, N_replicates=100, block_risks=None):
+        series_bytes = [risk._series_bytes() for risk in risks]
+        prepared = [cls.prepare_series(*pair) for pair in series_bytes]
+        
+        lengths = {len(x) for liq, ins, _, _ in prepared for x in (liq, ins)}
+        if len(lengths) != 1:
+            return [risk.lvar_and_ivar(alpha=alpha, N_replicates=N_replicates) for risk in risks]
+
+        if block_risks is None:
+            block_risks = risks
+        block_size = max(max(cls.prepare_series(*risk._series_bytes())[2:]) for risk in block_risks)
+        dists = [cls.pooled_means(liq_bytes, ins_bytes, block_size, N_replicates) for liq_bytes, ins_bytes in series_bytes]
+        
+        return [risk.vars_from_means(l_dist, i_dist, alpha=alpha) for risk, (l_dist, i_dist) in zip(risks, dists)]
+
+    """
+        Pooled circular block bootstrap start indices for series of length n, for the liquidation
+        and insolvency series respectively
+    """
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def pooled_starts(n, block_size, N_replicates=100):
+        rs = np.random.RandomState(42)
+        num_blocks = int(np.ceil(n/block_size))
+        l_starts = rs.randint(n, size=(N_replicates, num_blocks))
+        i_starts = rs.randint(n, size=(N_replicates, num_blocks))
+        l_starts.setflags(write=False)
+        i_starts.setflags(write=False)
+
+        return l_starts, i_starts
+
+    """
+        Replicate means of a liquidation and insolvency series pair, for the pooled start indices. Memoised 
+        on the series and the (pooled) block size, so e.g. the FT and VT means are reused across the LP fees
+    """
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def pooled_means(liq_bytes, ins_bytes, block_size, N_replicates=100):
+        liq, ins, _, _ = RiskMetrics.prepare_series(liq_bytes, ins_bytes)
+        l_starts, i_starts = RiskMetrics.pooled_starts(len(liq), block_size, N_replicates)
+        
+        l_dist = circular_block_means(liq, block_size, l_starts)
+        i_dist = circular_block_means(ins, block_size, i_starts)
+        l_dist.setflags(write=False)
+        i_dist.setflags(write=False)
+
+        return l_dist, i_dist
+
     """
         Convert VaRs to corresponding leverage constraints
     """
@@ -137,9 +329,7 @@ class RiskMetrics():
         Commpute the recommended leverage based on 
         Leverage = min(Lev_L, Lev_I), from the liquidation and insolvency leverages
     """
-    def recommended_leverage(self, time_horizon=0):
-        l_lev, i_lev = self.leverages(time_horizon=time_horizon)
-        if l_lev < i_lev:
-            return l_lev 
-        else:
-            return i_lev
\ No newline at end of file
+    def recommended_leverage(self):
+        if self._leverages is None:
+            self._leverages = self.leverages()
+        return min(self._leverages)
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+import pandas as pd
+from RiskMetrics import RiskMetrics, MIN_LENGTH_FOR_OPTIMAL_BLOCK
+from arch.bootstrap import optimal_block_length
+
+# AR(1) series with coefficient phi, as a simple model of the autocorrelated margin and PnL series
+def ar1_series(rs, n, phi=0.8):
+    x = np.zeros(n)
+    x[0] = rs.standard_normal()
+    for t in range(1, n):
+        x[t] = phi*x[t-1] + rs.standard_normal()
+    return x
+
+class TestRiskMetrics(unittest.TestCase):
+
+    def setUp(self):
+        # 50 days => block sizes of 6 and 8 from optimal_block_length, so the last block is truncated
+        rs = np.random.RandomState(3)
+        self.liq = 0.5 + 0.1*ar1_series(rs, 50)
+        self.ins = 1.0 + 0.1*ar1_series(rs, 50)
+
+    def test_short_series_block_size(self):
+        # The AR(1) plug-in should agree with optimal_block_length on a long enough AR(1) series
+        short_sizes, optimal_sizes = [], []
+        for seed in range(5):
+            x = ar1_series(np.random.RandomState(seed), 500, phi=0.6)
+            short_sizes.append(RiskMetrics.short_series_block_size(x))
+            optimal_sizes.append(int(optimal_block_length(x)["circular"].values[0])+1)
+        self.assertAlmostEqual(np.mean(short_sizes)/np.mean(optimal_sizes), 1, delta=0.25)
+
+        # and is used below MIN_LENGTH_FOR_OPTIMAL_BLOCK
+        x = ar1_series(np.random.RandomState(0), MIN_LENGTH_FOR_OPTIMAL_BLOCK-1)
+        self.assertEqual(RiskMetrics.block_size(x.tobytes()), RiskMetrics.short_series_block_size(x))
+        self.assertGreater(RiskMetrics.block_size(x.tobytes()), 1)
+
+    def test_bootstrap_means_match_replicates(self):
+        liq, ins, block_l, block_i = RiskMetrics.prepare_series(self.liq.tobytes(), self.ins.tobytes())
+        self.assertNotEqual(len(liq) % block_l, 0)
+        self.assertNotEqual(len(ins) % block_i, 0)
+
+        l_rep, i_rep = RiskMetrics.bootstrap_replicates(self.liq.tobytes(), self.ins.tobytes(), 100)
+        l_dist, i_dist = RiskMetrics.bootstrap_means(self.liq.tobytes(), self.ins.tobytes(), 100)
+        np.testing.assert_allclose(l_dist, l_rep.mean(axis=1), rtol=1e-12)
+        np.testing.assert_allclose(i_dist, i_rep.mean(axis=1), rtol=1e-12)
+
+    def test_batch_vars_match_individual_vars(self):
+        # All the series are rescalings of the same AR(1) path, so share the same block size
+        path = ar1_series(np.random.RandomState(0), 60)
+        df = pd.DataFrame({"im": np.ones(60)})
+        for k, actor in enumerate(["lp", "ft", "vt"]):
+            df[f"lm_{actor}"] = 0.5 - 0.1*(k+1)*path
+            df[f"pnl_{actor}"] = 0.2*(k+1)*path
+        risks = [RiskMetrics(df=df, notional=1000, liquidation_series=f"lm_{actor}", margin_series="im", \
+            pnl_series=f"pnl_{actor}") for actor in ["lp", "ft", "vt"]]
+        
+        block_sizes = {b for risk in risks for b in RiskMetrics.prepare_series(*risk._series_bytes())[2:]}
+        self.assertEqual(len(block_sizes), 1)
+
+        batch_vars = RiskMetrics.batch_lvar_and_ivar(risks, alpha=95, N_replicates=100)
+        for risk, (l_var, i_var) in zip(risks, batch_vars):
+            l_var_single, i_var_single = risk.lvar_and_ivar(alpha=95, N_replicates=100)
+            self.assertAlmostEqual(l_var, l_var_single, delta=1e-12)
+            self.assertAlmostEqual(i_var, i_var_single, delta=1e-12)
+
+    def test_batch_vars_with_fixed_block_risks(self):
+        # Only the LP PnL (and so its insolvency series) changes between the two pools, as when changing the LP fee,
+        # and it has a larger block size than the FT and VT series in the second pool
+        path = ar1_series(np.random.RandomState(0), 60, phi=0.3)
+        df = pd.DataFrame({"im": np.ones(60), "lm_lp": 0.5 - 0.1*path, "lm_ft": 0.5 - 0.1*path, "pnl_ft": 0.2*path, \
+            "lm_vt": 0.5 + 0.1*path, "pnl_vt": -0.2*path})
+        pool_vars, pool_block_sizes, pool_default_vars = [], [], []
+        for phi in [0.3, 0.9]:
+            df["pnl_lp"] = 0.2*ar1_series(np.random.RandomState(1), 60, phi=phi)
+            risks = [RiskMetrics(df=df, notional=1000, liquidation_series=f"lm_{actor}", margin_series="im", \
+                pnl_series=f"pnl_{actor}") for actor in ["lp", "ft", "vt"]]
+            pool_block_sizes.append(max(RiskMetrics.prepare_series(*risks[0]._series_bytes())[2:]))
+            pool_vars.append(RiskMetrics.batch_lvar_and_ivar(risks, alpha=95, N_replicates=100, block_risks=risks[1:]))
+            pool_default_vars.append(RiskMetrics.batch_lvar_and_ivar(risks, alpha=95, N_replicates=100))
+        ft_vt_block_size = max(b for risk in risks[1:] for b in RiskMetrics.prepare_series(*risk._series_bytes())[2:])
+        self.assertNotEqual(pool_block_sizes[0], pool_block_sizes[1])
+        self.assertGreater(pool_block_sizes[1], ft_vt_block_size)
+
+        # The FT and VT VaRs are unchanged with the block size from the FT and VT series, but not by default
+        self.assertEqual(pool_vars[0][1:], pool_vars[1][1:])
+        self.assertNotEqual(pool_default_vars[0][1:], pool_default_vars[1][1:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,10 @@
 import math
 import unittest
 
-from utils import fixedRateToTick, fixedRateToSqrtPrice, getSqrtRatioAtTick, sqrtPriceToFixedRate, getAmount0Delta, getAmount1Delta, notional_to_liquidity
+import numpy as np
+import pandas as pd
+
+from utils import fixedRateToTick, fixedRateToSqrtPrice, getSqrtRatioAtTick, sqrtPriceToFixedRate, getAmount0Delta, getAmount1Delta, notional_to_liquidity, moving_average
 
 class TestUtils(unittest.TestCase):
 
@@ -96,6 +99,21 @@ class TestUtils(unittest.TestCase):
             liquidity = notional_to_liquidity(notional, fixedRateToTick(high_fix), fixedRateToTick(low_fix))
             amount1 = getAmount1Delta(fixedRateToSqrtPrice(high_fix), fixedRateToSqrtPrice(low_fix), liquidity)
             self.assertAlmostEqual(notional, amount1)
+
+
+    def test_moving_average(self):
+        apys = np.random.RandomState(0).random_sample((40, 2))
+
+        for lookback in [1, 5, 6]: # Odd and even windows
+            expected = pd.DataFrame(apys).rolling(lookback).mean().to_numpy()
+            np.testing.assert_allclose(moving_average(apys, lookback), expected, rtol=1e-10)
+
+        # A NaN only affects the windows which contain it
+        apys[10, 0] = np.nan
+        ma = moving_average(apys, 5)
+        np.testing.assert_allclose(ma, pd.DataFrame(apys).rolling(5).mean().to_numpy(), rtol=1e-10)
+        self.assertTrue(np.isnan(ma[10:15, 0]).all())
+        self.assertTrue(np.isfinite(ma[15:, 0]).all())
             
 
 if __name__ == '__main__':
@@ -3,13 +3,17 @@ from MarginCalculator import MarginCalculator
 from PortfolioCalculator import PortfolioCalculator
 from Simulator import Simulator
 import json
+import multiprocessing
+import orjson
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import optuna
 import numpy as np
 # Positions -- want to disentangle positions from parameters
 from position_dict import position
 from constants import ALPHA, BETA, MIN_MARGIN_TO_INCENTIVIZE_LIQUIDATORS, SIGMA_SQUARED, XI_LOWER, XI_UPPER
-from utils import SECONDS_IN_YEAR, fixedRateToTick, notional_to_liquidity
+from utils import SECONDS_IN_YEAR, fixedRateToTick, moving_average, notional_to_liquidity
 from RNItoAPY import * 
 
 # ref: https://github.com/optuna/optuna-examples/blob/main/sklearn/sklearn_optuna_search_cv_simple.py
@@ -22,43 +26,116 @@ POSITION = "Optimised_test_stETH" # Example set of positions to simulate
 pos = position[POSITION]
 top_dir = f"./simulations/{POSITION}/"
 
-def normalise(array):
-    if array.max() != array.min():
-        return (array-array.min())/(array.max()-array.min())
+# Actor-level (metric, trader) pairs from the summary_dict which enter the objective function
+OBJECTIVE_METRICS = [(metric, f"{name} {actor}") for metric, name in [("SRs", "SR"), ("Frac Us", "Frac. und."), \
+    ("Liq. fact.", "Liq. fact."), ("Leverage", "Leverage"), ("LVaRs", "LVaR"), ("IVaRs", "IVaR")] for actor in ["VT", "FT", "LP"]] \
+        + [("Gaps", "Gap FT")]
+
+# Parse the raw RNI historical data. Cached, since the same file is loaded in every call to main. The
+# returned DataFrame is shared, so should not be modified in place (getPreparedRNIData works on a copy)
+@lru_cache(maxsize=None)
+def load_rni_data(path):
+    return pd.read_csv(path)
+
+# Mean and standard deviation of the array after min-max normalisation, computed without
+# building the normalised array
+def normalise_stats(array):
+    lo, hi = array.min(), array.max()
+    if hi != lo:
+        return (array.mean()-lo)/(hi-lo), array.std()/(hi-lo)
     else:
         raise Exception("ERROR: minimum and maximum values coincide in array normalisation. Check inputs!")
 
+# State shared by all the market scenarios in a call to main: the MarginCalculator, the PortfolioCalculator,
+# the APY models (keyed by volatility scaling F) and the original dates. Set once per worker process by 
+# init_scenario_worker, so that it is not pickled with every scenario
+scenario_state = {}
+
+def init_scenario_worker(mc, pc, df_apys, date_original):
+    scenario_state.update(mc=mc, pc=pc, df_apys=df_apys, date_original=date_original)
+
+# Run the IRS pool simulation for a single market scenario i.e. a given volatility scaling, tick range, fixed rate
+# market, leverage factor and LP fee. Returns the summary metrics and the mean protocol fee for the scenario, and
+# saves the full risk engine output to csv_path (if provided)
+# The ticks and the LP liquidity only depend on the tick range, so are computed once per range in main
+def run_scenario(f, rate_range, market, lev, fee, ticks, liquidity, csv_path):
+    mc, pc = scenario_state["mc"], scenario_state["pc"]
+    df_apy, date_original = scenario_state["df_apys"][f], scenario_state["date_original"]
+    lower, upper = ticks
+
+    # The different APY bounds are automatically passed to the TMC for different tokens
+    # We need to update the simulated APY model passed to the TMC in each bound
+    pc.gammaFee = fee # Reset the fee
+    df_apy_mc, balances = mc.generate_full_output(df_apy=df_apy, date_original=date_original, tokens=pos["tokens"], notional=pos["notional"], lp_fix=pos["lp_fix"], \
+        lp_var=pos["lp_var"], tick_l=lower, tick_u=upper, fr_market=market, leverage_factor=lev)
+    
+    # Now run the initial methods in the PortfolioCalculator to generate the LP PnL and the associated trader fees
+    pc.df_protocol = df_apy_mc
+    pc.liquidity = liquidity
+
+    # Reset the PortfolioCalculator with the new FT and VT positions (these change in each fixed rate market, which can
+    # now also change with the token)
+    pc.set_positions(balances)
+    
+    # Start by generating the new LP PnL and net margins (n.b. check the notional assignment is correct)
+    pc.generate_lp_pnl_and_net_margin(tick_l=lower, tick_u=upper, lp_leverage_factor=lev)
+    
+    # Now compute the protocol collected fees, the associated Sharpe ratios, and the fraction of
+    # undercollateralised events
+    sharpes, undercols, l_factors, levs, the_apys, l_vars, i_vars, l_levs, i_levs, gaps = pc.sharpe_ratio_undercol_events(tick_l=lower, tick_u=upper)
+    metrics = {
+        "SRs": sharpes,
+        "Frac Us": undercols,
+        "Liq. fact.": l_factors,
+        "Leverage": levs,
+        "APYs": the_apys,
+        "LVaRs": l_vars,
+        "IVaRs": i_vars,
+        "L-Levs": l_levs,
+        "I-Levs": i_levs,
+        "Gaps": gaps,
+    }
+    if csv_path is not None:
+        df_apy_mc.to_csv(csv_path)
+
+    return metrics, df_apy_mc["protocol_fee"].mean()
+
+# Run a group of scenarios which only differ by the LP fee in the same worker, so that they share its bootstrap caches
+def run_scenario_group(scenarios):
+    return [run_scenario(*scenario) for scenario in scenarios]
+
 def main(out_name, tau_u = 1.5, tau_d = 0.7, gamma_unwind=1, dev_lm=0.5, dev_im=0.3, lookback=30, \
     r_init_lm=0.3, r_init_im=0.1, lambda_fee=0.1, gamma_fee=0.003, a_factor=1, b_factor=1, \
-    write_all_out=False, sim_dir=None, debug=False):
+    write_all_out=False, sim_dir=None, debug=False, n_workers=None):
 
     # Generate a simulation-specific directory, based on different tuneable parameters
     if sim_dir is None:
         sim_dir = top_dir+f"{DF_TO_OPTIMIZE}/"
     
-    if not os.path.exists(sim_dir):
-        os.makedirs(sim_dir)
+    os.makedirs(sim_dir, exist_ok=True) # Parallel Optuna trials share the same directory
    
-    # Reload data-set e.g. every time Optuna enters a new trial
+    # The raw data-set is only parsed once e.g. rather than every time Optuna enters a new trial
     token = pos["tokens"][0]
-    df_raw = pd.read_csv(f"./rni_historical_data/{DF_TO_OPTIMIZE}_{token}.csv")
+    df_raw = load_rni_data(f"./rni_historical_data/{DF_TO_OPTIMIZE}_{token}.csv")
     # Get APYs from the raw liquidity indices
     df = getPreparedRNIData(df_raw)
     df = getFrequentData(df, frequency=int(lookback*2))
     df = getDailyApy([[token, df]], lookback=lookback)
 
-    df.set_index("date", inplace=True)
     # We will use the moving avaerage APY, with given lookback, to compute the
-    # calibration and volatility parameters in the CIR model
-    for token in df.columns:
-        df[token] = df[token].rolling(lookback).mean() # MA 
+    # calibration and volatility parameters in the CIR model. This is computed directly on the
+    # APY values (trailing window, with NaNs until the window is full, as in DataFrame.rolling), 
+    # keeping the dates separately
+    dates = df.pop("date").to_numpy()
+    apys_ma = moving_average(df.to_numpy(dtype=np.float64), lookback) # MA 
 
     # We need to make sure that the DataFrame does not contain NaNs because of a lookback window that
     # is too large
-    if len(df)-lookback <= pos["pool_size"]:
-        lookback = len(df)-pos["pool_size"] # Maximum possible lookback
+    if len(apys_ma)-lookback <= pos["pool_size"]:
+        lookback = len(apys_ma)-pos["pool_size"] # Maximum possible lookback
     if pos["pool_size"] != -1:
-        df = df.iloc[-pos["pool_size"]:] # Only keep the latest data for a given N-day pool
+        dates, apys_ma = dates[-pos["pool_size"]:], apys_ma[-pos["pool_size"]:] # Only keep the latest data for a given N-day pool
+    df = pd.DataFrame(apys_ma, index=pd.Index(dates, name="date"), columns=df.columns)
 
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
     # # # 1. Instantiate Simulator: inherits from Calibrator, gets CIR model params, generates the APY bounds # # # 
@@ -132,13 +209,16 @@ def main(out_name, tau_u = 1.5, tau_d = 0.7, gamma_unwind=1, dev_lm=0.5, dev_im=
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
     # # # 4. Run simulations of the IRS pool over all the different market conditions # # #
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # 
-    summary_dict = {}
-    # Volatility loop
+    # Build the full set of market scenarios to simulate. The APY model only depends on the volatility scaling, 
+    # so we generate it once per F and share it across all the corresponding scenarios
+    # Scenarios which only differ by the LP fee are grouped together, so that they run in the same worker
+    scenario_groups, df_apys = [], {}
     for f in f_values:
         df_apy = sim.model_apy(dt=1, F=f) # APY model
         df_apy = sim.compute_apy_confidence_interval(xi_lower=98, xi_upper=39, df_apy=df_apy, F=f) # APY bounds (xi upper and lower subject to change)
         if write_all_out:
             df_apy.to_csv(sim_dir+out_name+f"_F_value_{f}.csv")
+        df_apys[f] = df_apy
         
         # Tick range loop
         for rate_range in rate_ranges:
@@ -147,52 +227,58 @@ def main(out_name, tau_u = 1.5, tau_d = 0.7, gamma_unwind=1, dev_lm=0.5, dev_im=
             # Get the relevant ticks from the rates
             # Remember: higher fixed rate => lower tick, from the geometry of the vAMM
             upper, lower = fixedRateToTick(rate_range[0]), fixedRateToTick(rate_range[1])
-            
-            # The different APY bounds are automatically passed to the TMC for different tokens
-            # We need to update the simulated APY model passed to the TMC in each bound
-            fee_collector = [] # Tracks protocol fees
+            liquidity = notional_to_liquidity(notional=pos["notional"], tick_l=lower, tick_u=upper)
             for market in fr_markets:
                 for lev in leverage_factors:
+                    scenario_group = []
                     for fee in gamma_fees:
-                        pc.gammaFee = fee # Reset the fee
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"] = {}
-                        
-                        df_apy_mc, balances = mc.generate_full_output(df_apy=df_apy, date_original=df.index, tokens=pos["tokens"], notional=pos["notional"], lp_fix=pos["lp_fix"], \
-                            lp_var=pos["lp_var"], tick_l=lower, tick_u=upper, fr_market=market, leverage_factor=lev)
-                        
-                        # Now run the initial methods in the PortfolioCalculator to generate the LP PnL and the associated trader fees
-                        pc.df_protocol = df_apy_mc
-                        pc.liquidity = notional_to_liquidity(notional=pos["notional"], \
-                            tick_l=lower, tick_u=upper)
-
-
-                        # Reset the PortfolioCalculator with the new FT and VT positions (these change in each fixed rate market, which can
-                        # now also change with the token)
-                        pc.set_positions(balances)
-                        
-                        # Start by generating the new LP PnL and net margins (n.b. check the notional assignment is correct)
-                        pc.generate_lp_pnl_and_net_margin(tick_l=lower, tick_u=upper, lp_leverage_factor=lev)
-                        
-                        # Now compute the protocol collected fees, the associated Sharpe ratios, and the fraction of
-                        # undercollateralised events
-                        sharpes, undercols, l_factors, levs, the_apys, l_vars, i_vars, l_levs, i_levs, gaps = pc.sharpe_ratio_undercol_events(tick_l=lower, tick_u=upper)
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["SRs"] = sharpes
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["Frac Us"] = undercols
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["Liq. fact."] = l_factors
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["Leverage"] = levs
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["APYs"] = the_apys
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["LVaRs"] = l_vars
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["IVaRs"] = i_vars
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["L-Levs"] = l_levs
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["I-Levs"] = i_levs
-                        summary_dict[f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"]["Gaps"] = gaps
-                        fee_collector.append(df_apy_mc["protocol_fee"].mean()) 
-                        df_apy_mc.to_csv(sim_dir+out_name+f"_F_value_{f}_{market}_{tick_name}_{fee}_full_risk_engine_output.csv")
-
-                           
-    # Save summary_dict to json here
-    with open(sim_dir+f"summary_simulations_{out_name}.json", "w") as fp:
-        json.dump(summary_dict, fp, indent=4)
+                        # Full risk engine outputs are only saved when writing all the simulation runs out
+                        csv_path = sim_dir+out_name+f"_F_value_{f}_{market}_{tick_name}_{fee}_full_risk_engine_output.csv" if write_all_out else None
+                        scenario_group.append((f, rate_range, market, lev, fee, (lower, upper), liquidity, csv_path))
+                    scenario_groups.append(scenario_group)
+    scenarios = [scenario for scenario_group in scenario_groups for scenario in scenario_group]
+
+    # Each scenario is independent, so we distribute them over a pool of worker processes. The shared state
+    # is sent to each worker once, when it starts
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) - 1)
+    n_workers = min(n_workers, len(scenario_groups))
+    shared_state = (mc, pc, df_apys, df.index)
+    if n_workers <= 1:
+        init_scenario_worker(*shared_state)
+        results = [run_scenario(*scenario) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_scenario_worker, initargs=shared_state) as executor:
+            futures = [executor.submit(run_scenario_group, scenario_group) for scenario_group in scenario_groups]
+            results = [result for future in futures for result in future.result()]
+
+    # Merge the scenario outputs, keeping the same ordering as the original nested loops
+    # We also collect the actor-level metrics used in the objective here, per token, in a single pass
+    summary_dict = {}
+    # For each metric we keep the per-token values, together with their (precomputed) "trader: token" keys
+    objective_metrics = {(metric, trader): [(trader+": "+token, []) for token in pos["tokens"]] for metric, trader in OBJECTIVE_METRICS}
+    fee_collector, last_f_and_range = [], None # Tracks protocol fees, for each tick range
+    for scenario, (metrics, protocol_fee) in zip(scenarios, results):
+        f, rate_range, market, lev, fee = scenario[:5]
+        key = f"F={f} scale, {market} market, {rate_range} tick, {lev} leverage factor, {fee} fee"
+        summary_dict[key] = metrics
+        for (metric, _), per_token in objective_metrics.items():
+            metric_values = metrics[metric]
+            for token_key, token_values in per_token:
+                token_values.append(metric_values[token_key])
+        if (f, rate_range) != last_f_and_range:
+            fee_collector, last_f_and_range = [], (f, rate_range)
+        fee_collector.append(protocol_fee)
+    
+    # Flatten each metric over the tokens and scenarios (dropping NaNs, as in the stacked summary DataFrames)
+    flat = {}
+    for key, per_token in objective_metrics.items():
+        values = np.array([v for _, token_values in per_token for v in token_values], dtype=np.float64)
+        flat[key] = values[~np.isnan(values)]
+
+    # Save summary_dict to json here (orjson serialises the numpy metric values natively)
+    with open(sim_dir+f"summary_simulations_{out_name}.json", "wb") as fp:
+        fp.write(orjson.dumps(summary_dict, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
 
     # # # # # # # # # # # # # # # # # # # 
@@ -201,45 +287,38 @@ def main(out_name, tau_u = 1.5, tau_d = 0.7, gamma_unwind=1, dev_lm=0.5, dev_im=
     # The output of the objective function should be an aggregate metric we are either trying to maximize or minimize
     # Maximise the average SR, keeping the spread wrt volatility low, and minimise the undercollateralisarion 
     # We first need to normalise the resulting SR DataFrames such that all data is in [0,1)
-    from MasterPlotter import MasterPlotter as mp
-    flatSR = np.array([mp.dict_to_df(summary_dict, "SR VT", "SRs").stack().values, mp.dict_to_df(summary_dict, "SR FT", "SRs").stack().values, \
-        mp.dict_to_df(summary_dict, "SR LP", "SRs").stack().values]).flatten()
+    flatSR = np.concatenate([flat[("SRs", "SR VT")], flat[("SRs", "SR FT")], flat[("SRs", "SR LP")]])
     
-    flatU = np.array([mp.dict_to_df(summary_dict, "Frac. und. VT", "Frac Us").stack().values, mp.dict_to_df(summary_dict, "Frac. und. FT", "Frac Us").stack().values, \
-        mp.dict_to_df(summary_dict, "Frac. und. LP", "Frac Us").stack().values]).flatten()
+    flatU = np.concatenate([flat[("Frac Us", "Frac. und. VT")], flat[("Frac Us", "Frac. und. FT")], flat[("Frac Us", "Frac. und. LP")]])
     
-    flatLiq = np.array([mp.dict_to_df(summary_dict, "Liq. fact. VT", "Liq. fact.").stack().values, mp.dict_to_df(summary_dict, "Liq. fact. FT", "Liq. fact.").stack().values, \
-        mp.dict_to_df(summary_dict, "Liq. fact. LP", "Liq. fact.").stack().values]).flatten()
+    flatLiq = np.concatenate([flat[("Liq. fact.", "Liq. fact. VT")], flat[("Liq. fact.", "Liq. fact. FT")], flat[("Liq. fact.", "Liq. fact. LP")]])
     
     
     # Get the different actor leverages to use directly in the optimisation
-    flatLev = np.array([mp.dict_to_df(summary_dict, "Leverage VT", "Leverage").stack().values, \
-                        mp.dict_to_df(summary_dict, "Leverage FT", "Leverage").stack().values, \
-                        mp.dict_to_df(summary_dict, "Leverage LP", "Leverage").stack().values]).flatten()
+    flatLev = np.concatenate([flat[("Leverage", "Leverage VT")], flat[("Leverage", "Leverage FT")], flat[("Leverage", "Leverage LP")]])
     
     # Pick up the FT leverage to use for regularisation
-    meanLevFT = mp.dict_to_df(summary_dict, "Leverage FT", "Leverage").stack().values.flatten().mean()
+    meanLevFT = flat[("Leverage", "Leverage FT")].mean()
     
     # Normalise and get the means
-    meanSR = normalise(flatSR).mean()   
-    meanU = 0 if np.all(flatU==0) else normalise(flatU).mean() 
-    meanLiq = 0 if np.all(flatLiq==0) else normalise(flatLiq).mean() 
+    meanSR, _ = normalise_stats(flatSR)
+    meanU = 0 if np.all(flatU==0) else normalise_stats(flatU)[0]
+    meanLiq = 0 if np.all(flatLiq==0) else normalise_stats(flatLiq)[0]
     meanFee =  np.array(fee_collector).mean() 
-    meanLev = normalise(flatLev).mean() 
-    stdLev = normalise(flatLev).std() 
+    meanLev, stdLev = normalise_stats(flatLev)
     
     # Pick up the VaRs for regularisation (in their natural units)
-    meanLVaR_LP = np.array(mp.dict_to_df(summary_dict, "LVaR LP", "LVaRs").stack().values).flatten().mean()
-    meanIVaR_LP = np.array(mp.dict_to_df(summary_dict, "IVaR LP", "IVaRs").stack().values).flatten().mean()
+    meanLVaR_LP = flat[("LVaRs", "LVaR LP")].mean()
+    meanIVaR_LP = flat[("IVaRs", "IVaR LP")].mean()
     
-    meanLVaR_FT = np.array(mp.dict_to_df(summary_dict, "LVaR FT", "LVaRs").stack().values).flatten().mean()
-    meanIVaR_FT = np.array(mp.dict_to_df(summary_dict, "IVaR FT", "IVaRs").stack().values).flatten().mean()
+    meanLVaR_FT = flat[("LVaRs", "LVaR FT")].mean()
+    meanIVaR_FT = flat[("IVaRs", "IVaR FT")].mean()
     
-    meanLVaR_VT = np.array(mp.dict_to_df(summary_dict, "LVaR VT", "LVaRs").stack().values).flatten().mean()
-    meanIVaR_VT = np.array(mp.dict_to_df(summary_dict, "IVaR VT", "IVaRs").stack().values).flatten().mean()
+    meanLVaR_VT = flat[("LVaRs", "LVaR VT")].mean()
+    meanIVaR_VT = flat[("IVaRs", "IVaR VT")].mean()
 
     # FT margin gap for regularisation
-    meanGap_FT = np.array(mp.dict_to_df(summary_dict, "Gap FT", "Gaps").stack().values).flatten().mean()
+    meanGap_FT = flat[("Gaps", "Gap FT")].mean()
 
     if debug:
         print("flatSR: ", flatSR)
@@ -286,6 +365,7 @@ def run_with_a_single_set_of_params(parser):
     parser.add_argument("-l", "--lookback", type=int, help="Lookback parameter (no. of days) for the APY moving average", default=30)
     parser.add_argument("-w", "--write_all_out", action="store_true", help="Save all simulation runs to different DataFrames", default=False)
     parser.add_argument("-d", "--debug", action="store_true", help="Debug mode", default=False)
+    parser.add_argument("-nw", "--n_workers", type=int, help="Number of worker processes for the market scenarios", default=None)
 
     tuneables = parser.parse_args()
 
@@ -295,48 +375,85 @@ def run_with_a_single_set_of_params(parser):
     main(out_name=f"df_{DF_TO_OPTIMIZE}_RiskEngineModel", **tuneable_dict)
 
 
-def objective(trial):
-
-    tau_u = trial.suggest_categorical("tau_u", np.linspace(1.0001, 10, 100).tolist())
-    tau_d = trial.suggest_categorical("tau_d", np.linspace(0.0001, 1, 1000).tolist())
-    gamma_unwind = trial.suggest_categorical("gamma_unwind", np.linspace(0.0001, 10, 1000).tolist())
-    dev_lm = trial.suggest_categorical("dev_lm", np.linspace(0.0001, 10, 1000).tolist())
-    dev_im = trial.suggest_categorical("dev_im", np.linspace(0.0001, 10, 1000).tolist())
-    r_init_lm = trial.suggest_categorical("r_init_lm", np.linspace(0.001, 0.2, 100).tolist())
-    r_init_im = trial.suggest_categorical("r_init_im", np.linspace(0.001, 0.2, 100).tolist())
-    a_factor = trial.suggest_categorical("a_factor", np.linspace(0.5, 5, 50).tolist())
-    b_factor = trial.suggest_categorical("b_factor", np.linspace(0.3, 3, 50).tolist())
-    lookback = trial.suggest_categorical("lookback", np.arange(3, 40, 1).tolist()) 
-    lambda_fee = trial.suggest_categorical("lambda_fee", np.linspace(0.001, 0.1, 100).tolist()) 
-    gamma_fee = trial.suggest_categorical("gamma_fee", np.linspace(0.0003, 0.03, 100).tolist()) 
+def objective(trial, n_workers=None):
+
+    tau_u = trial.suggest_float("tau_u", 1.0001, 10)
+    tau_d = trial.suggest_float("tau_d", 0.0001, 1)
+    gamma_unwind = trial.suggest_float("gamma_unwind", 0.0001, 10)
+    dev_lm = trial.suggest_float("dev_lm", 0.0001, 10)
+    dev_im = trial.suggest_float("dev_im", 0.0001, 10)
+    r_init_lm = trial.suggest_float("r_init_lm", 0.001, 0.2)
+    r_init_im = trial.suggest_float("r_init_im", 0.001, 0.2)
+    a_factor = trial.suggest_float("a_factor", 0.5, 5)
+    b_factor = trial.suggest_float("b_factor", 0.3, 3)
+    lookback = trial.suggest_int("lookback", 3, 39) 
+    lambda_fee = trial.suggest_float("lambda_fee", 0.001, 0.1) 
+    gamma_fee = trial.suggest_float("gamma_fee", 0.0003, 0.03) 
     
     # Default protocol fee constraints for v1
     # Here we summarise default fee struccture parameters for v1
     #lambda_fee = 0 # i.e. no protocol collected fees -- update this
     #gamma_fee = pos["gamma_fee"] # Just investigating a few different fee parameters for v1: 0.001, 0.003, 0.005 
 
-    obj = main(out_name=f"df_{DF_TO_OPTIMIZE}_RiskEngineModel",
+    # Each trial writes out its own summary, since trials can run in parallel processes
+    obj = main(out_name=f"df_{DF_TO_OPTIMIZE}_RiskEngineModel_trial_{trial.number}",
                         tau_u=tau_u, tau_d=tau_d, gamma_unwind=gamma_unwind, dev_lm=dev_lm,
                         dev_im=dev_im, r_init_im=r_init_im, r_init_lm=r_init_lm, lambda_fee=lambda_fee,
-                        gamma_fee=gamma_fee, a_factor=a_factor, b_factor=b_factor, lookback=lookback
+                        gamma_fee=gamma_fee, a_factor=a_factor, b_factor=b_factor, lookback=lookback,
+                        n_workers=n_workers
     )
 
     return obj
 
 
+# Run n_trials of a study held in an RDB storage, e.g. from one of several optimisation processes
+# sharing the same study
+def optimize_study(study_name, storage, n_trials, n_workers=None):
+    study = optuna.load_study(study_name=study_name, storage=storage, sampler=optuna.samplers.TPESampler(), \
+        pruner=optuna.pruners.SuccessiveHalvingPruner())
+    study.optimize(lambda trial: objective(trial, n_workers=n_workers), n_trials=n_trials)
+
+
 def run_param_optimization(parser):
 
-    parser.add_argument("-n_trials", "--n_trials", type=float, help="Number of optimization trials", default=2)
+    parser.add_argument("-n_trials", "--n_trials", type=int, help="Number of optimization trials", default=2)
+    parser.add_argument("-n_jobs", "--n_jobs", type=int, help="Number of optimisation processes running trials in parallel", default=1)
+    parser.add_argument("-storage", "--storage", type=str, help="Optuna RDB storage URL shared by the optimisation processes " \
+        "(defaults to a SQLite file in the Optuna output directory when n_jobs > 1)", default=None)
     parser.add_argument("-d", "--debug", action="store_true", help="Debug mode", default=False)
-    n_trials = parser.parse_args().n_trials
+    args = parser.parse_args()
+    n_trials = args.n_trials
+    if args.n_jobs < 1:
+        parser.error("--n_jobs must be a positive number of processes")
+    n_jobs = min(args.n_jobs, n_trials)
 
-    study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(), pruner=optuna.pruners.SuccessiveHalvingPruner())
-    study.optimize(objective, n_trials=n_trials)
-    
     # Relevant output plots
     out_dir = top_dir+f"{DF_TO_OPTIMIZE}/optuna/"
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # By default the trials run one at a time, with the scenarios of each trial spread over a pool of worker processes.
+    # Parallel trials run in separate processes sharing the study through the RDB storage, and the cores are split 
+    # between their scenario pools to avoid oversubscription
+    storage = args.storage
+    if storage is None and n_jobs > 1:
+        storage = f"sqlite:///{out_dir}optuna_{DF_TO_OPTIMIZE}.db"
+    n_workers = max(1, ((os.cpu_count() or 1) - 1) // n_jobs)
+
+    study = optuna.create_study(storage=storage, direction="maximize", sampler=optuna.samplers.TPESampler(), pruner=optuna.pruners.SuccessiveHalvingPruner())
+    if n_jobs == 1:
+        study.optimize(lambda trial: objective(trial, n_workers=n_workers), n_trials=n_trials)
+    else:
+        trials_per_job = [n_trials // n_jobs + int(i < n_trials % n_jobs) for i in range(n_jobs)]
+        # Spawn (rather than fork) so that the processes do not inherit the storage connections
+        ctx = multiprocessing.get_context("spawn")
+        processes = [ctx.Process(target=optimize_study, args=(study.study_name, storage, n, n_workers)) for n in trials_per_job[1:]]
+        for process in processes:
+            process.start()
+        optimize_study(study.study_name, storage, trials_per_job[0], n_workers)
+        for process in processes:
+            process.join()
+        if any(process.exitcode != 0 for process in processes):
+            raise Exception("ERROR: at least one of the optimisation processes failed. Check the logs above!")
 
     # Output optimised results
     trial = study.best_trial
@@ -2,6 +2,8 @@ import math
 from bleach import clean
 
 import numpy as np
+import pandas as pd
+from scipy.ndimage import uniform_filter1d
 
 from constants import FT_ERROR, FT_FACTOR
 
@@ -102,6 +104,20 @@ def date_to_unix_time(df_input, date_original, separator=" ", timezone_separator
     return df
 
 
+# Trailing moving average over the rows of a 2D array of values (e.g. the APYs of each token), with the first
+# lookback-1 rows set to NaN, as in DataFrame.rolling(lookback).mean(). uniform_filter1d works with a running sum,
+# which would spread a single NaN/inf to every later row, so non-finite values fall back to the pandas rolling mean
+def moving_average(values, lookback):
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        return pd.DataFrame(values).rolling(lookback).mean().to_numpy()
+
+    ma = np.full_like(values, np.nan)
+    # origin shifts the window so that it ends at each row
+    ma[lookback-1:] = uniform_filter1d(values, size=lookback, axis=0, origin=(lookback-1)//2)[lookback-1:]
+    return ma
+
+
 # """
 #     This is an important method which organises the outputs of the Simulator into relevant APYs and
 #     rates. Specifically we have the following: